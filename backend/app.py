@@ -1,8 +1,11 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional
 from pydantic import BaseModel
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
 import json
@@ -13,19 +16,25 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import time
 import asyncio
+from functools import partial
 
 # Load environment variables
 load_dotenv()
 
-from database import get_db, User, Secret, SecurityLog, create_tables
-from auth import verify_password, get_password_hash, create_access_token, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from database import get_db, SessionLocal, User, Secret, SecurityLog, create_tables, sanitize_secret_name
+from auth import (verify_password, get_password_hash, create_access_token, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES,
+                  create_stream_token, verify_stream_token, STREAM_TOKEN_EXPIRE_SECONDS)
 from metrics import (get_metrics, record_request, record_login_attempt, record_security_event, 
-                    record_aws_operation, update_active_users, update_secrets_count)
+                    record_aws_operation, update_active_users, update_secrets_count, update_event_streams)
+from encryption import (encrypt_value, decrypt_value, generate_wrapped_data_key,
+                        encrypt_with_master_key, decrypt_with_master_key, DecryptionError)
+from events import change_hub
 
 
 
 app = FastAPI(title="SafeVault API")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 app.add_middleware(
     CORSMiddleware,
@@ -63,6 +72,7 @@ create_tables()
 # Background task to update business metrics
 @app.on_event("startup")
 async def startup_event():
+    await change_hub.start()
     asyncio.create_task(update_business_metrics())
 
 async def update_business_metrics():
@@ -79,6 +89,8 @@ async def update_business_metrics():
             secrets_count = db.query(Secret).count()
             update_secrets_count(secrets_count)
             
+            update_event_streams(change_hub.connection_count())
+            
             db.close()
         except Exception as e:
             print(f"Error updating business metrics: {e}")
@@ -131,6 +143,7 @@ def log_security_event(db: Session, event_type: str, username: str, ip_address:
     )
     db.add(security_log)
     db.commit()
+    publish_security_event(username, event_type, details)
     
     # Check for suspicious activity
     if event_type == "login_failed":
@@ -180,18 +193,52 @@ SafeVault Security Team
         """
         send_security_alert(user_email, subject, message)
 
+def log_security_events(db: Session, events: List[dict]):
+    """Log several security events with a single commit.
+
+    Each event holds the log_security_event arguments except db and user_email.
+    Intended for bulk operations; does not send alerts.
+    """
+    for event in events:
+        record_security_event(event["event_type"])
+    db.add_all([SecurityLog(**event) for event in events])
+    db.commit()
+    for event in events:
+        publish_security_event(event["username"], event["event_type"], event["details"])
+
+def publish_security_event(username: str, event_type: str, details: str):
+    """Push an audit event to the user's change feed, if they have one"""
+    change_hub.publish(username, "security_event", {
+        "event_type": event_type,
+        "details": details,
+        "created_at": datetime.utcnow().isoformat()
+    }, create=False)
+
+def secret_event_data(name: str, description: str, category: str, created_at: datetime) -> dict:
+    """Change feed payload for a secret; matches SecretResponse and never includes the value"""
+    return {
+        "name": name,
+        "description": description,
+        "category": category or 'general',
+        "created_date": created_at.isoformat()
+    }
+
 # Local storage for development
 SECRETS_FILE = "secrets.json"
 
 def load_secrets():
     if os.path.exists(SECRETS_FILE):
         with open(SECRETS_FILE, 'r') as f:
-            return json.load(f)
+            data = json.load(f)
+        # Files written before encryption hold the secrets dict directly
+        if isinstance(data, dict) and set(data) == {"encrypted"}:
+            return json.loads(decrypt_with_master_key(data["encrypted"]))
+        return data
     return {}
 
 def save_secrets(secrets):
     with open(SECRETS_FILE, 'w') as f:
-        json.dump(secrets, f)
+        json.dump({"encrypted": encrypt_with_master_key(json.dumps(secrets))}, f)
 
 # AWS Secrets Manager setup
 print(f"AWS_ACCESS_KEY_ID: {os.getenv('AWS_ACCESS_KEY_ID')[:10]}..." if os.getenv('AWS_ACCESS_KEY_ID') else "AWS_ACCESS_KEY_ID: Not set")
@@ -223,6 +270,71 @@ except Exception as e:
     USE_AWS = False
     print(f"❌ AWS client initialization failed: {str(e)}")
 
+# Bulk operation settings
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '100'))
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '100'))  # Per request for the :batch endpoints
+EVENT_HEARTBEAT_SECONDS = int(os.getenv('EVENT_HEARTBEAT_SECONDS', '15'))  # Keeps proxies from closing idle streams
+# Keep concurrency at or below botocore's default pool of 10 connections
+BULK_AWS_CONCURRENCY = int(os.getenv('BULK_AWS_CONCURRENCY', '8'))
+BULK_AWS_RATE_LIMIT = float(os.getenv('BULK_AWS_RATE_LIMIT', '20'))  # AWS calls per second
+
+def put_aws_secret(aws_secret_name: str, value: str, description: str) -> bool:
+    """Create a secret in AWS, updating it if it already exists. Returns True when stored."""
+    try:
+        secrets_client.create_secret(Name=aws_secret_name, SecretString=value, Description=description)
+        record_aws_operation("create_secret", True)
+        return True
+    except Exception as e:
+        if 'ResourceExistsException' not in str(e):
+            record_aws_operation("create_secret", False)
+            print(f"❌ AWS create failed for {aws_secret_name}: {type(e).__name__}")
+            return False
+
+    try:
+        secrets_client.update_secret(SecretId=aws_secret_name, SecretString=value, Description=description)
+        record_aws_operation("update_secret", True)
+        return True
+    except Exception as e:
+        record_aws_operation("update_secret", False)
+        print(f"❌ AWS update failed for {aws_secret_name}: {type(e).__name__}")
+        return False
+
+class AWSRateLimiter:
+    """Spaces out AWS calls so bulk operations stay under the Secrets Manager request quota"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+aws_rate_limiter = AWSRateLimiter(BULK_AWS_RATE_LIMIT)
+
+async def run_aws_calls(calls, rate_limited: bool = True):
+    """Run blocking AWS calls concurrently with bounded concurrency.
+
+    Each call is a zero-argument function; results (or raised exceptions) are returned in order.
+    Writes should stay rate limited; reads have a much higher AWS quota and can skip it.
+    """
+    semaphore = asyncio.Semaphore(BULK_AWS_CONCURRENCY)
+
+    async def run(call):
+        async with semaphore:
+            if rate_limited:
+                await aws_rate_limiter.wait()
+            return await asyncio.to_thread(call)
+
+    return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
+
 class SecretRequest(BaseModel):
     name: str
     value: str
@@ -235,6 +347,12 @@ class SecretResponse(BaseModel):
     category: str
     created_date: str
 
+class BatchNamesRequest(BaseModel):
+    names: List[str]
+
+class BatchCreateRequest(BaseModel):
+    secrets: List[SecretRequest]
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -255,6 +373,8 @@ class UserResponse(BaseModel):
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     token = credentials.credentials
     payload = verify_token(token)
+    if payload.get("scope") == "events":
+        raise HTTPException(status_code=401, detail="Stream tokens only open the change feed")
     username = payload.get("sub")
     
     user = db.query(User).filter(User.username == username).first()
@@ -262,6 +382,64 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
+def get_stream_username(token: Optional[str] = None, credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Authenticate a long-lived stream.
+
+    Takes the session token in the Authorization header, or a stream token from
+    POST /secrets/events/token as ?token= because browsers' EventSource cannot send
+    headers. Uses a short-lived session so idle streams do not hold a pooled database
+    connection.
+    """
+    if credentials:
+        payload = verify_token(credentials.credentials)
+    elif token:
+        payload = verify_stream_token(token)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    username = payload.get("sub")
+    
+    db = SessionLocal()
+    try:
+        if db.query(User.id).filter(User.username == username).first() is None:
+            raise HTTPException(status_code=401, detail="User not found")
+    finally:
+        db.close()
+    return username
+
+def find_user_secrets(db: Session, user_id: int, names: List[str]) -> Dict[str, Secret]:
+    """Resolve secret names to the user's rows with one indexed query.
+
+    An exact name match wins over a sanitized one, so rows whose sanitized name was
+    suffixed by the migration (see database.migrate_secret_sanitized_names) stay
+    reachable under their original name.
+    """
+    keys = {name: sanitize_secret_name(name) for name in names}
+    rows = db.query(Secret).filter(
+        Secret.user_id == user_id,
+        or_(Secret.name.in_(list(keys)), Secret.sanitized_name.in_(set(keys.values())))
+    ).all()
+    by_name = {row.name: row for row in rows}
+    by_sanitized = {row.sanitized_name: row for row in rows}
+    found = {name: by_name.get(name) or by_sanitized.get(key) for name, key in keys.items()}
+    return {name: row for name, row in found.items() if row is not None}
+
+def lock_user_data_key(db: Session, user_id: int, read: bool = False) -> Optional[str]:
+    """Lock the user's row and return their wrapped data key.
+
+    Writers lock the row before encrypting and readers take a shared lock before decrypting,
+    held until the caller's transaction ends, so rotate_keys.py never swaps the key while a
+    request is using it. A user still without a key gets one with a conditional update, so
+    concurrent requests all end up with the same key.
+    """
+    query = db.query(User.wrapped_data_key).filter(User.id == user_id)
+    wrapped_key = query.with_for_update(read=read).scalar()
+    if not wrapped_key and not read:
+        db.query(User).filter(User.id == user_id, User.wrapped_data_key.is_(None)).update(
+            {"wrapped_data_key": generate_wrapped_data_key()}, synchronize_session=False
+        )
+        wrapped_key = query.scalar()
+    return wrapped_key
+
 @app.post("/signup")
 async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     # Check if user exists
@@ -276,7 +454,8 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         username=user_data.username,
         email=user_data.email,
         hashed_password=hashed_password,
-        role=user_data.role
+        role=user_data.role,
+        wrapped_data_key=generate_wrapped_data_key()
     )
     db.add(db_user)
     db.commit()
@@ -361,21 +540,13 @@ async def list_secrets(current_user: User = Depends(get_current_user), db: Sessi
                     sanitized_secret_name = aws_name.replace(f"{current_user.username}-", "", 1)
                     aws_secrets[sanitized_secret_name] = aws_secret
             
-            # Get current database secret names
-            db_secret_names = {secret.name for secret in user_secrets}
+            # Index local secrets by their persisted AWS name for O(1) matching
+            local_by_sanitized = {secret.sanitized_name: secret for secret in user_secrets}
+            sync_events = []
             
             # Add secrets from AWS that are missing in database
-            # Match by sanitized names
             for sanitized_name, aws_secret in aws_secrets.items():
-                # Find matching local secret by sanitizing local names
-                matching_local = None
-                for local_secret in user_secrets:
-                    local_sanitized = local_secret.name.replace(' ', '-').replace('_', '-').lower()
-                    if local_sanitized == sanitized_name:
-                        matching_local = local_secret
-                        break
-                
-                if not matching_local:
+                if sanitized_name not in local_by_sanitized:
                     print(f"➕ Adding {sanitized_name} from AWS to database")
                     new_secret = Secret(
                         name=sanitized_name.replace('-', ' ').title(),  # Convert back to readable name
@@ -385,27 +556,34 @@ async def list_secrets(current_user: User = Depends(get_current_user), db: Sessi
                         user_id=current_user.id,
                         created_at=aws_secret.get('CreatedDate', datetime.utcnow())
                     )
+                    # Keep the AWS key even if the readable name would sanitize differently
+                    new_secret.sanitized_name = sanitized_name
                     db.add(new_secret)
                     user_secrets.append(new_secret)
+                    local_by_sanitized[sanitized_name] = new_secret
+                    sync_events.append(("secret_created", {
+                        **secret_event_data(new_secret.name, new_secret.description, new_secret.category, new_secret.created_at),
+                        "source": "aws"
+                    }))
             
             # Remove AWS-synced secrets that no longer exist in AWS
-            # Match by sanitized names to handle spaces and special characters
-            secrets_to_remove = []
-            for secret in user_secrets:
-                if secret.value == "[Stored in AWS]":  # Only AWS-synced secrets
-                    local_sanitized = secret.name.replace(' ', '-').replace('_', '-').lower()
-                    if local_sanitized not in aws_secrets:
-                        secrets_to_remove.append(secret)
-                        print(f"🗑️ Removing {secret.name} - deleted from AWS")
-            
-            # Delete from database
+            secrets_to_remove = [
+                secret for secret in user_secrets
+                if secret.value == "[Stored in AWS]" and secret.sanitized_name not in aws_secrets  # Only AWS-synced secrets
+            ]
             for secret in secrets_to_remove:
+                print(f"🗑️ Removing {secret.name} - deleted from AWS")
                 db.delete(secret)
-                user_secrets.remove(secret)
+                sync_events.append(("secret_deleted", {"name": secret.name, "source": "aws"}))
+            if secrets_to_remove:
+                removed_ids = {id(secret) for secret in secrets_to_remove}
+                user_secrets = [secret for secret in user_secrets if id(secret) not in removed_ids]
             
             # Commit all changes
             if aws_secrets or secrets_to_remove:
                 db.commit()
+                for event_type, data in sync_events:
+                    change_hub.publish(current_user.username, event_type, data)
                 # Count actual additions by checking new secrets
                 added_count = len([s for s in user_secrets if s.value == "[Stored in AWS]"])
                 removed_count = len(secrets_to_remove)
@@ -430,11 +608,442 @@ async def list_secrets(current_user: User = Depends(get_current_user), db: Sessi
     print(f"Returning {len(result)} secrets to frontend")
     return result
 
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+async def store_secret_batch(secrets: List[SecretRequest], current_user: User, db: Session) -> List[dict]:
+    """Store a batch of secrets with concurrent AWS writes and a single database commit.
+
+    Returns one result per input secret, in order. If several entries map to the same
+    AWS name, the last occurrence wins and earlier ones are reported as skipped.
+    """
+    results = [{"name": secret.name, "status": "pending", "aws": False} for secret in secrets]
+    sanitized_names = [sanitize_secret_name(secret.name) for secret in secrets]
+    latest = {sanitized_name: index for index, sanitized_name in enumerate(sanitized_names)}
+    for index, sanitized_name in enumerate(sanitized_names):
+        if latest[sanitized_name] != index:
+            results[index].update(status="skipped", error="Superseded by a later entry with the same name")
+    to_store = sorted(latest.values())
+
+    if USE_AWS:
+        calls = [
+            partial(
+                put_aws_secret,
+                f"{current_user.username}-{sanitized_names[index]}",
+                secrets[index].value,
+                f"User: {current_user.username} - {secrets[index].description}"
+            )
+            for index in to_store
+        ]
+        outcomes = await run_aws_calls(calls)
+        for index, outcome in zip(to_store, outcomes):
+            results[index]["aws"] = outcome is True
+
+    # Resolve existing rows with one query so re-imports update instead of duplicating
+    wrapped_key = lock_user_data_key(db, current_user.id)
+    existing = find_user_secrets(db, current_user.id, [secrets[index].name for index in to_store])
+    change_events = []
+    for index in to_store:
+        secret = secrets[index]
+        encrypted_value = encrypt_value(secret.value, wrapped_key, current_user.id)
+        db_secret = existing.get(secret.name)
+        if db_secret:
+            db_secret.value = encrypted_value
+            db_secret.description = secret.description
+            db_secret.category = secret.category or 'general'
+            results[index]["status"] = "updated"
+        else:
+            db_secret = Secret(
+                name=secret.name,
+                value=encrypted_value,
+                description=secret.description,
+                category=secret.category or 'general',
+                user_id=current_user.id,
+                created_at=datetime.utcnow()
+            )
+            db.add(db_secret)
+            results[index]["status"] = "created"
+        # Built before commit, which would expire the rows and reload them one by one
+        change_events.append((
+            f"secret_{results[index]['status']}",
+            secret_event_data(db_secret.name, db_secret.description, db_secret.category, db_secret.created_at)
+        ))
+
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Batch commit failed: {type(e).__name__} - {str(e)}")
+        for index in to_store:
+            results[index].update(status="error", error="Database write failed")
+        return results
+
+    for event_type, data in change_events:
+        change_hub.publish(current_user.username, event_type, data)
+    return results
+
+@app.get("/secrets/export")
+async def export_secrets(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Stream the user's vault as NDJSON.
+
+    Each secret is one {"type": "secret"} line. A {"type": "progress"} line follows every
+    batch and a {"type": "summary"} line ends the stream. Secrets whose value only lives in
+    AWS and cannot be fetched are reported as {"type": "error"} lines.
+    """
+    user_id = current_user.id
+    username = current_user.username
+    log_security_event(
+        db, "secrets_exported", username, request.client.host,
+        request.headers.get("user-agent", ""), "Bulk export of vault"
+    )
+
+    def load_page(after_id: int):
+        # Short session per page: nothing stays open while a slow client reads, which on
+        # SQLite would hold a shared lock and make every other write fail. The key is read
+        # under the row lock in the same transaction, so a rotation is never seen half done,
+        # and the lock is released before anything is awaited or yielded.
+        page_db = SessionLocal()
+        try:
+            wrapped_key = lock_user_data_key(page_db, user_id, read=True)
+            rows = (
+                page_db.query(Secret)
+                .filter(Secret.user_id == user_id, Secret.id > after_id)
+                .order_by(Secret.id)
+                .limit(BULK_BATCH_SIZE)
+                .all()
+            )
+            return wrapped_key, rows
+        finally:
+            page_db.close()
+
+    async def generate():
+        exported = 0
+        failed = 0
+        last_id = 0
+        while True:
+            wrapped_key, chunk = load_page(last_id)
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            aws_values = {}
+            aws_rows = [secret for secret in chunk if secret.value == "[Stored in AWS]"]
+            if aws_rows and USE_AWS:
+                calls = [
+                    partial(secrets_client.get_secret_value, SecretId=f"{username}-{secret.sanitized_name}")
+                    for secret in aws_rows
+                ]
+                for secret, outcome in zip(aws_rows, await run_aws_calls(calls, rate_limited=False)):
+                    if isinstance(outcome, Exception):
+                        record_aws_operation("get_secret", False)
+                    else:
+                        record_aws_operation("get_secret", True)
+                        aws_values[secret.id] = outcome['SecretString']
+
+            lines = []
+            for secret in chunk:
+                try:
+                    value = aws_values[secret.id] if secret.id in aws_values else decrypt_value(secret.value, wrapped_key, user_id)
+                except DecryptionError as e:
+                    print(f"❌ Export of {secret.name} for {username} failed: {e}")
+                    failed += 1
+                    lines.append({"type": "error", "name": secret.name, "error": "Value could not be decrypted"})
+                    continue
+                if value == "[Stored in AWS]":
+                    failed += 1
+                    lines.append({"type": "error", "name": secret.name, "error": "Value stored in AWS could not be retrieved"})
+                    continue
+                exported += 1
+                lines.append({
+                    "type": "secret",
+                    "name": secret.name,
+                    "value": value,
+                    "description": secret.description,
+                    "category": secret.category or 'general',
+                    "created_date": secret.created_at.isoformat()
+                })
+            lines.append({"type": "progress", "exported": exported, "failed": failed})
+
+            yield "".join(json.dumps(line) + "\n" for line in lines)
+
+        print(f"✅ Exported {exported} secrets for {username} ({failed} failed)")
+        yield json.dumps({"type": "summary", "exported": exported, "failed": failed}) + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="safevault-export.ndjson"'}
+    )
+
+@app.post("/secrets/events/token")
+async def create_event_stream_token(current_user: User = Depends(get_current_user)):
+    """Issue a short-lived token for opening GET /secrets/events from a browser"""
+    return {"token": create_stream_token(current_user.username), "expires_in": STREAM_TOKEN_EXPIRE_SECONDS}
+
+@app.get("/secrets/events")
+async def secret_events(request: Request, username: str = Depends(get_stream_username)):
+    """Server-sent event stream of changes to the user's vault.
+
+    Events: secret_created, secret_updated, secret_deleted and security_event. A client
+    resuming with Last-Event-ID (or ?last_event_id=) receives only the events it missed,
+    or a reset event when it must refetch GET /secrets.
+    """
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+
+    async def stream():
+        queue, initial = await change_hub.subscribe(username, last_event_id)
+        try:
+            yield "retry: 5000\n\n"
+            for payload in initial:
+                yield payload
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            change_hub.unsubscribe(username, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/secrets/import")
+async def import_secrets(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Import secrets from an NDJSON body, storing them in batches as the body streams in.
+
+    Accepts the output of GET /secrets/export; progress and summary lines are skipped.
+    Returns totals and a per-line result.
+    """
+    results = []
+    batch = []
+    batch_lines = []
+    line_number = 0
+    buffer = b""
+
+    async def flush():
+        for line, result in zip(batch_lines, await store_secret_batch(batch, current_user, db)):
+            results.append({"line": line, **result})
+        print(f"📥 Import progress for {current_user.username}: {line_number} lines processed")
+        batch.clear()
+        batch_lines.clear()
+
+    def parse(raw: bytes):
+        if not raw.strip():
+            return
+        try:
+            item = json.loads(raw)
+            if not isinstance(item, dict):
+                raise ValueError("Expected a JSON object")
+            if item.get("type", "secret") != "secret":
+                return
+            batch.append(SecretRequest(**item))
+            batch_lines.append(line_number)
+        except (ValueError, TypeError) as e:
+            results.append({"line": line_number, "name": None, "status": "error", "aws": False, "error": str(e)})
+
+    def reject_oversized():
+        results.append({
+            "line": line_number, "name": None, "status": "error", "aws": False,
+            "error": f"Line exceeds {MAX_IMPORT_LINE_BYTES} bytes"
+        })
+
+    # While skipping, the rest of an oversized line is discarded up to the next newline
+    skipping = False
+    async for chunk in request.stream():
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\n")
+        for raw in complete:
+            if skipping:
+                skipping = False
+                continue
+            line_number += 1
+            if len(raw) > MAX_IMPORT_LINE_BYTES:
+                reject_oversized()
+                continue
+            parse(raw)
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            if not skipping:
+                line_number += 1
+                reject_oversized()
+                skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        line_number += 1
+        parse(buffer)
+    if batch:
+        await flush()
+
+    summary = {status_name: 0 for status_name in ("created", "updated", "skipped", "error")}
+    for result in results:
+        summary[result["status"]] += 1
+    aws_stored = sum(1 for result in results if result["aws"])
+
+    log_security_event(
+        db, "secrets_imported", current_user.username, request.client.host,
+        request.headers.get("user-agent", ""),
+        f"Bulk import: {summary['created']} created, {summary['updated']} updated, {summary['error']} failed"
+    )
+    print(f"✅ Import for {current_user.username}: {summary}, {aws_stored} stored in AWS")
+
+    results.sort(key=lambda result: result["line"])
+    return {"processed": line_number, **summary, "aws_stored": aws_stored, "results": results}
+
+def check_batch_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if count > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+
+@app.post("/secrets:batchGet")
+async def batch_get_secrets(batch: BatchNamesRequest, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Fetch several secrets in one request, returning a per-name result"""
+    names = list(dict.fromkeys(batch.names))
+    check_batch_size(len(names))
+    sanitized_names = {name: sanitize_secret_name(name) for name in names}
+    keys = list(dict.fromkeys(sanitized_names.values()))
+
+    aws_values = {}
+    if USE_AWS:
+        calls = [
+            partial(secrets_client.get_secret_value, SecretId=f"{current_user.username}-{key}")
+            for key in keys
+        ]
+        for key, outcome in zip(keys, await run_aws_calls(calls, rate_limited=False)):
+            if isinstance(outcome, Exception):
+                record_aws_operation("get_secret", False)
+            else:
+                record_aws_operation("get_secret", True)
+                aws_values[key] = outcome['SecretString']
+
+    wrapped_key = lock_user_data_key(db, current_user.id, read=True)
+    db_secrets = find_user_secrets(db, current_user.id, names)
+    results = []
+    events = []
+    for name in names:
+        key = sanitized_names[name]
+        db_secret = db_secrets.get(name)
+        if key in aws_values:
+            results.append({"name": name, "status": "ok", "value": aws_values[key], "source": "aws"})
+        elif db_secret and db_secret.value != "[Stored in AWS]":
+            try:
+                value = decrypt_value(db_secret.value, wrapped_key, current_user.id)
+            except DecryptionError as e:
+                print(f"❌ Batch get of {name} for {current_user.username} failed: {e}")
+                results.append({"name": name, "status": "error", "error": "Value could not be decrypted"})
+                continue
+            results.append({"name": name, "status": "ok", "value": value, "source": "database"})
+        elif db_secret:
+            results.append({"name": name, "status": "error", "error": "Value stored in AWS could not be retrieved"})
+            continue
+        else:
+            results.append({"name": name, "status": "not_found"})
+            continue
+        events.append({
+            "event_type": "secret_accessed",
+            "username": current_user.username,
+            "ip_address": request.client.host,
+            "user_agent": request.headers.get("user-agent", ""),
+            "details": f"Accessed secret: {name} (batch)"
+        })
+
+    if events:
+        log_security_events(db, events)
+    print(f"✅ Batch get for {current_user.username}: {len(events)}/{len(names)} secrets returned")
+
+    return {"found": len(events), "missing": len(names) - len(events), "results": results}
+
+@app.post("/secrets:batchCreate")
+async def batch_create_secrets(batch: BatchCreateRequest, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Create or update several secrets in one request, returning a per-item result"""
+    check_batch_size(len(batch.secrets))
+
+    results = [
+        {"index": index, **result}
+        for index, result in enumerate(await store_secret_batch(batch.secrets, current_user, db))
+    ]
+
+    events = [
+        {
+            "event_type": "secret_created",
+            "username": current_user.username,
+            "ip_address": request.client.host,
+            "user_agent": request.headers.get("user-agent", ""),
+            "details": f"Stored secret: {result['name']} (batch)"
+        }
+        for result in results if result["status"] in ("created", "updated")
+    ]
+    if events:
+        log_security_events(db, events)
+    print(f"✅ Batch create for {current_user.username}: {len(events)}/{len(results)} secrets stored")
+
+    return {"stored": len(events), "failed": len(results) - len(events), "results": results}
+
+@app.post("/secrets:batchDelete")
+async def batch_delete_secrets(batch: BatchNamesRequest, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete several secrets in one request, returning a per-name result"""
+    # Names that map to the same AWS secret are deleted once, under the first spelling
+    names_by_key = {}
+    for name in batch.names:
+        names_by_key.setdefault(sanitize_secret_name(name), name)
+    keys = list(names_by_key)
+    check_batch_size(len(keys))
+
+    db_secrets = find_user_secrets(db, current_user.id, list(names_by_key.values()))
+
+    aws_deleted = set()
+    if USE_AWS:
+        calls = [
+            partial(
+                secrets_client.delete_secret,
+                SecretId=f"{current_user.username}-{key}",
+                ForceDeleteWithoutRecovery=True
+            )
+            for key in keys
+        ]
+        for key, outcome in zip(keys, await run_aws_calls(calls)):
+            if isinstance(outcome, Exception):
+                record_aws_operation("delete_secret", False)
+            else:
+                record_aws_operation("delete_secret", True)
+                aws_deleted.add(key)
+
+    results = []
+    events = []
+    deleted_names = []
+    for key, name in names_by_key.items():
+        db_secret = db_secrets.get(name)
+        if not db_secret:
+            results.append({"name": name, "status": "not_found", "aws": key in aws_deleted})
+            continue
+        # Clients key their lists by the stored name, not the spelling in the request
+        deleted_names.append(db_secret.name)
+        db.delete(db_secret)
+        results.append({"name": name, "status": "deleted", "aws": key in aws_deleted})
+        events.append({
+            "event_type": "secret_deleted",
+            "username": current_user.username,
+            "ip_address": request.client.host,
+            "user_agent": request.headers.get("user-agent", ""),
+            "details": f"Deleted secret: {name} (batch)"
+        })
+
+    # Row deletions and audit events go out in the same commit
+    log_security_events(db, events)
+    for deleted_name in deleted_names:
+        change_hub.publish(current_user.username, "secret_deleted", {"name": deleted_name})
+    print(f"✅ Batch delete for {current_user.username}: {len(events)}/{len(keys)} secrets deleted")
+
+    return {"deleted": len(events), "missing": len(keys) - len(events), "results": results}
+
 @app.post("/secrets")
 async def create_secret(secret: SecretRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     # Store in AWS with user prefix and sanitized name
     # AWS secret names can only contain alphanumeric characters, hyphens, and underscores
-    sanitized_name = secret.name.replace(' ', '-').replace('_', '-').lower()
+    sanitized_name = sanitize_secret_name(secret.name)
     aws_secret_name = f"{current_user.username}-{sanitized_name}"
     aws_stored = False
     print(f"🔄 Attempting to store in AWS as: {aws_secret_name}")
@@ -491,28 +1100,49 @@ async def create_secret(secret: SecretRequest, current_user: User = Depends(get_
                 if 'InvalidSignatureException' in error_msg or 'AccessDenied' in error_msg:
                     print("💡 Check AWS credentials and permissions")
     
-    # Also store metadata in database
+    # Also store metadata in database, updating the row that maps to the same AWS secret
     print(f"Creating secret with category: {secret.category}")
-    db_secret = Secret(
-        name=secret.name,
-        value=secret.value,
-        description=secret.description,
-        category=secret.category or 'general',
-        user_id=current_user.id
-    )
-    db.add(db_secret)
-    db.commit()
+    # A concurrent create of the same name can win the unique index; retry once as an update
+    for attempt in range(2):
+        wrapped_key = lock_user_data_key(db, current_user.id)
+        db_secret = find_user_secrets(db, current_user.id, [secret.name]).get(secret.name)
+        encrypted_value = encrypt_value(secret.value, wrapped_key, current_user.id)
+        event_type = "secret_updated" if db_secret else "secret_created"
+        if db_secret:
+            db_secret.value = encrypted_value
+            db_secret.description = secret.description
+            db_secret.category = secret.category or 'general'
+        else:
+            db_secret = Secret(
+                name=secret.name,
+                value=encrypted_value,
+                description=secret.description,
+                category=secret.category or 'general',
+                user_id=current_user.id
+            )
+            db.add(db_secret)
+        try:
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+            print(f"⚠️ Concurrent create of {secret.name} - updating the stored row instead")
     print(f"Secret saved with category: {db_secret.category}")
+    secret_data = secret_event_data(db_secret.name, db_secret.description, db_secret.category, db_secret.created_at)
+    change_hub.publish(current_user.username, event_type, secret_data)
     
+    # The stored row is returned so clients can update their list without waiting for the feed
     if aws_stored:
-        return {"message": f"Secret stored in AWS eu-west-1 and database"}
+        return {"message": f"Secret stored in AWS eu-west-1 and database", "secret": secret_data}
     else:
-        return {"message": "Secret created in secure local database"}
+        return {"message": "Secret created in secure local database", "secret": secret_data}
 
 @app.get("/secrets/{secret_name}")
 async def get_secret(secret_name: str, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     # Try to get from AWS first
-    sanitized_name = secret_name.replace(' ', '-').replace('_', '-').lower()
+    sanitized_name = sanitize_secret_name(secret_name)
     aws_secret_name = f"{current_user.username}-{sanitized_name}"
     
     if USE_AWS:
@@ -527,9 +1157,16 @@ async def get_secret(secret_name: str, request: Request, current_user: User = De
             print(f"Error type: {type(e).__name__}")
     
     # Fallback to database
-    secret = db.query(Secret).filter(Secret.name == secret_name, Secret.user_id == current_user.id).first()
+    wrapped_key = lock_user_data_key(db, current_user.id, read=True)
+    secret = find_user_secrets(db, current_user.id, [secret_name]).get(secret_name)
     if not secret:
         raise HTTPException(status_code=404, detail="Secret not found")
+    # Decrypt before logging: the audit commit releases the key lock
+    try:
+        value = decrypt_value(secret.value, wrapped_key, current_user.id)
+    except DecryptionError as e:
+        print(f"❌ Decrypt Error for {secret_name}: {e}")
+        raise HTTPException(status_code=500, detail="Secret value could not be decrypted")
     print(f"✅ Retrieved from database: {secret_name}")
     
     # Log secret access
@@ -538,12 +1175,12 @@ async def get_secret(secret_name: str, request: Request, current_user: User = De
         request.headers.get("user-agent", ""), f"Accessed secret: {secret_name}"
     )
     
-    return {"name": secret.name, "value": secret.value}
+    return {"name": secret.name, "value": value}
 
 @app.delete("/secrets/{secret_name}")
 async def delete_secret(secret_name: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     # Delete from AWS first
-    sanitized_name = secret_name.replace(' ', '-').replace('_', '-').lower()
+    sanitized_name = sanitize_secret_name(secret_name)
     aws_secret_name = f"{current_user.username}-{sanitized_name}"
     aws_deleted = False
     
@@ -559,12 +1196,13 @@ async def delete_secret(secret_name: str, current_user: User = Depends(get_curre
             print(f"Error type: {type(e).__name__}")
     
     # Delete from database
-    secret = db.query(Secret).filter(Secret.name == secret_name, Secret.user_id == current_user.id).first()
+    secret = find_user_secrets(db, current_user.id, [secret_name]).get(secret_name)
     if not secret:
         raise HTTPException(status_code=404, detail="Secret not found")
     
     db.delete(secret)
     db.commit()
+    change_hub.publish(current_user.username, "secret_deleted", {"name": secret.name})
     
     if aws_deleted:
         return {"message": "Secret deleted from AWS eu-west-1 and database"}
@@ -8,6 +8,7 @@ import os
 SECRET_KEY = os.getenv("SECRET_KEY", "safevault-jwt-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+STREAM_TOKEN_EXPIRE_SECONDS = 60  # Only needs to outlive opening the event stream
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -27,6 +28,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_stream_token(username: str):
+    """Issue a short-lived token that can only open the change feed.
+
+    EventSource cannot send headers, so this goes in the query string instead of the
+    session token, which would otherwise end up in proxy and access logs.
+    """
+    return create_access_token(
+        {"sub": username, "scope": "events"},
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    )
+
+def verify_stream_token(token: str):
+    payload = verify_token(token)
+    if payload.get("scope") != "events":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Stream token required"
+        )
+    return payload
+
 def verify_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
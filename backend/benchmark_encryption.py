@@ -0,0 +1,50 @@
+"""Benchmark the per-operation overhead of encrypting secret values.
+
+Usage:
+    python benchmark_encryption.py [--iterations N] [--size BYTES]
+
+Compares a cached data key against unwrapping the data key on every operation,
+which is what encryption would cost without the cache.
+"""
+import argparse
+import os
+import time
+from encryption import encrypt_value, decrypt_value, generate_wrapped_data_key, unwrap_data_key, data_key_cache
+
+def microseconds_per_op(operation, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        operation()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+def uncached(operation):
+    def run():
+        data_key_cache.clear()
+        return operation()
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SafeVault value encryption")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=256, help="secret value size in bytes")
+    args = parser.parse_args()
+
+    wrapped_key = generate_wrapped_data_key()
+    value = os.urandom(args.size // 2 + 1).hex()[:args.size]
+    encrypted = encrypt_value(value, wrapped_key, 1)
+
+    cases = [
+        ("unwrap data key", lambda: unwrap_data_key(wrapped_key)),
+        ("encrypt (cached key)", lambda: encrypt_value(value, wrapped_key, 1)),
+        ("decrypt (cached key)", lambda: decrypt_value(encrypted, wrapped_key, 1)),
+        ("encrypt (unwrap per op)", uncached(lambda: encrypt_value(value, wrapped_key, 1))),
+        ("decrypt (unwrap per op)", uncached(lambda: decrypt_value(encrypted, wrapped_key, 1))),
+    ]
+
+    print(f"{args.iterations} iterations, {args.size} byte values")
+    for name, operation in cases:
+        operation()  # warm up
+        print(f"  {name:<26} {microseconds_per_op(operation, args.iterations):8.2f} µs/op")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Index, inspect, text
 import sqlite3
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, validates
 from datetime import datetime
 import os
+from encryption import generate_wrapped_data_key
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./safevault.db")
 
@@ -11,6 +12,10 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def sanitize_secret_name(name: str) -> str:
+    """Convert a secret name into the form used for AWS secret names"""
+    return name.replace(' ', '-').replace('_', '-').lower()
+
 class User(Base):
     __tablename__ = "users"
     
@@ -20,6 +25,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, default="user")
     is_active = Column(Boolean, default=True)
+    # Per-user data key for secret values, wrapped by the master key (see encryption.py)
+    wrapped_data_key = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     secrets = relationship("Secret", back_populates="owner")
@@ -29,6 +36,8 @@ class Secret(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
+    # AWS secret name without the username prefix, kept in sync with name
+    sanitized_name = Column(String, nullable=False)
     value = Column(String, nullable=False)
     description = Column(String, default="")
     category = Column(String, default="general")
@@ -37,11 +46,20 @@ class Secret(Base):
     
     owner = relationship("User", back_populates="secrets")
 
+    __table_args__ = (
+        Index("ix_secrets_user_sanitized_name", "user_id", "sanitized_name", unique=True),
+    )
+
+    @validates("name")
+    def update_sanitized_name(self, key, name):
+        self.sanitized_name = sanitize_secret_name(name)
+        return name
+
 class SecurityLog(Base):
     __tablename__ = "security_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    event_type = Column(String, nullable=False)  # 'login_failed', 'login_success', 'password_changed', 'secret_accessed'
+    event_type = Column(String, nullable=False)  # 'login_failed', 'login_success', 'password_changed', 'secret_accessed', 'secret_created', 'secret_deleted', 'secrets_exported', 'secrets_imported'
     username = Column(String, nullable=False)
     ip_address = Column(String, nullable=False)
     user_agent = Column(String, default="")
@@ -55,6 +73,104 @@ def get_db():
     finally:
         db.close()
 
+def add_missing_column(table: str, column: str, column_type: str):
+    """Add a column to a table created before the column existed"""
+    if column not in {c["name"] for c in inspect(engine).get_columns(table)}:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        print(f"✅ Added {table}.{column}")
+
+def set_not_null(table: str, column: str):
+    """Make a column added by add_missing_column NOT NULL, matching freshly created tables.
+
+    Only PostgreSQL is altered: SQLite cannot change a column's constraints in place, so
+    there the column stays nullable and the model (which always sets it) enforces it.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    if next(c for c in inspect(engine).get_columns(table) if c["name"] == column)["nullable"]:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+        print(f"✅ Set {table}.{column} NOT NULL")
+
+def migrate_secret_sanitized_names():
+    """Add and backfill secrets.sanitized_name on databases created before the column existed.
+
+    Older databases can hold several rows per user whose names sanitize to the same
+    value (e.g. "API Key" and "api_key"); offline these were separate secrets. The newest
+    row keeps the plain sanitized name and the others get "-<id>" appended, so no data
+    is lost. Lookups still find those rows by their exact name.
+
+    Once every row has a value the column is made NOT NULL (see set_not_null; on SQLite
+    it stays nullable).
+    """
+    index = next(i for i in Secret.__table__.indexes if i.name == "ix_secrets_user_sanitized_name")
+    if index.name in {i["name"] for i in inspect(engine).get_indexes("secrets")}:
+        return
+
+    add_missing_column("secrets", "sanitized_name", "VARCHAR")
+    with engine.begin() as conn:
+        rows = conn.execute(text("SELECT id, name FROM secrets WHERE sanitized_name IS NULL")).fetchall()
+        for start in range(0, len(rows), 500):
+            conn.execute(
+                text("UPDATE secrets SET sanitized_name = :sanitized_name WHERE id = :id"),
+                [{"id": row.id, "sanitized_name": sanitize_secret_name(row.name)} for row in rows[start:start + 500]]
+            )
+        print(f"✅ Backfilled sanitized names for {len(rows)} secrets")
+
+        collisions = conn.execute(text(
+            "SELECT user_id, sanitized_name FROM secrets GROUP BY user_id, sanitized_name HAVING COUNT(*) > 1"
+        )).fetchall()
+        for collision in collisions:
+            taken = {
+                row.sanitized_name for row in conn.execute(
+                    text("SELECT sanitized_name FROM secrets WHERE user_id = :user_id"),
+                    {"user_id": collision.user_id}
+                )
+            }
+            older = conn.execute(
+                text("""
+                    SELECT id, name FROM secrets
+                    WHERE user_id = :user_id AND sanitized_name = :sanitized_name
+                    ORDER BY id DESC
+                """),
+                {"user_id": collision.user_id, "sanitized_name": collision.sanitized_name}
+            ).fetchall()[1:]
+            for row in older:
+                new_name = f"{collision.sanitized_name}-{row.id}"
+                while new_name in taken:
+                    new_name += "-dup"
+                taken.add(new_name)
+                conn.execute(
+                    text("UPDATE secrets SET sanitized_name = :sanitized_name WHERE id = :id"),
+                    {"id": row.id, "sanitized_name": new_name}
+                )
+                print(f"⚠️ Secret {row.id} ({row.name!r}, user {collision.user_id}) collides on "
+                      f"{collision.sanitized_name!r}; stored as {new_name!r}")
+
+    index.create(bind=engine)
+
+def backfill_user_data_keys():
+    """Issue data keys to users created before per-user keys existed.
+
+    Each update only applies while the key is still unset, so replicas starting at the
+    same time cannot replace a key that another one has already issued.
+    """
+    with engine.begin() as conn:
+        user_ids = [row.id for row in conn.execute(text("SELECT id FROM users WHERE wrapped_data_key IS NULL"))]
+        for start in range(0, len(user_ids), 500):
+            conn.execute(
+                text("UPDATE users SET wrapped_data_key = :key WHERE id = :id AND wrapped_data_key IS NULL"),
+                [{"id": user_id, "key": generate_wrapped_data_key()} for user_id in user_ids[start:start + 500]]
+            )
+    if user_ids:
+        print(f"✅ Issued data keys for {len(user_ids)} users")
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    migrate_secret_sanitized_names()
+    # Outside the migration so databases migrated before this step get it too
+    set_not_null("secrets", "sanitized_name")
+    add_missing_column("users", "wrapped_data_key", "VARCHAR")
+    backfill_user_data_keys()
     print("✅ Database tables created with category support")
\ No newline at end of file
@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from metrics import record_data_key_cache
+
+# Master key wraps each user's data key; data keys encrypt secret values.
+# Old master keys stay listed in PREVIOUS_MASTER_KEYS until rotate_keys.py has rewrapped every data key.
+MASTER_KEY = os.getenv("MASTER_KEY", "safevault-master-key-change-in-production")
+PREVIOUS_MASTER_KEYS = [key for key in os.getenv("PREVIOUS_MASTER_KEYS", "").split(",") if key]
+DATA_KEY_CACHE_SIZE = int(os.getenv("DATA_KEY_CACHE_SIZE", "1024"))
+DATA_KEY_CACHE_TTL = int(os.getenv("DATA_KEY_CACHE_TTL", "300"))  # seconds
+
+ENCRYPTED_PREFIX = "enc:v1:"
+NONCE_SIZE = 12
+
+def _derive_key(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+def _key_id(key: bytes) -> str:
+    return hashlib.sha256(b"safevault-key-id:" + key).hexdigest()[:8]
+
+_current_master_key = _derive_key(MASTER_KEY)
+CURRENT_MASTER_KEY_ID = _key_id(_current_master_key)
+master_ciphers = {_key_id(key): AESGCM(key) for key in map(_derive_key, PREVIOUS_MASTER_KEYS)}
+master_ciphers[CURRENT_MASTER_KEY_ID] = AESGCM(_current_master_key)
+
+def _seal(cipher: AESGCM, plaintext: bytes, aad: bytes) -> str:
+    nonce = os.urandom(NONCE_SIZE)
+    return base64.b64encode(nonce + cipher.encrypt(nonce, plaintext, aad)).decode()
+
+def _open(cipher: AESGCM, sealed: str, aad: bytes) -> bytes:
+    blob = base64.b64decode(sealed)
+    return cipher.decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], aad)
+
+def _master_cipher(key_id: str) -> AESGCM:
+    cipher = master_ciphers.get(key_id)
+    if cipher is None:
+        raise ValueError(f"Unknown master key {key_id}; add it to PREVIOUS_MASTER_KEYS")
+    return cipher
+
+class DecryptionError(ValueError):
+    """A stored value could not be decrypted: wrong or missing key, or corrupted data"""
+
+def generate_wrapped_data_key() -> str:
+    """Create a new data key and return it wrapped by the current master key"""
+    return wrap_data_key(AESGCM.generate_key(bit_length=256))
+
+def wrap_data_key(data_key: bytes) -> str:
+    cipher = master_ciphers[CURRENT_MASTER_KEY_ID]
+    return f"{CURRENT_MASTER_KEY_ID}:{_seal(cipher, data_key, b'safevault-data-key')}"
+
+def unwrap_data_key(wrapped_key: str) -> bytes:
+    key_id, sealed = wrapped_key.split(":", 1)
+    return _open(_master_cipher(key_id), sealed, b"safevault-data-key")
+
+def needs_rewrap(wrapped_key: str) -> bool:
+    return not wrapped_key.startswith(f"{CURRENT_MASTER_KEY_ID}:")
+
+class DataKeyCache:
+    """Bounded LRU cache of unwrapped data keys, held as ready-to-use ciphers, with a time-to-live.
+
+    Keyed by the wrapped key itself, so rewrapped or rotated keys never hit a stale entry.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, wrapped_key: str) -> AESGCM:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(wrapped_key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(wrapped_key)
+                record_data_key_cache(True)
+                return entry[0]
+
+        cipher = AESGCM(unwrap_data_key(wrapped_key))
+        record_data_key_cache(False)
+        with self.lock:
+            self.entries[wrapped_key] = (cipher, now + self.ttl)
+            self.entries.move_to_end(wrapped_key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return cipher
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+data_key_cache = DataKeyCache(DATA_KEY_CACHE_SIZE, DATA_KEY_CACHE_TTL)
+
+def is_encrypted(value: str) -> bool:
+    return value.startswith(ENCRYPTED_PREFIX)
+
+def encrypt_value(value: str, wrapped_key: str, user_id: int) -> str:
+    """Encrypt a secret value with the user's data key (AES-256-GCM, bound to the user id)"""
+    cipher = data_key_cache.get(wrapped_key)
+    return ENCRYPTED_PREFIX + _seal(cipher, value.encode(), f"user:{user_id}".encode())
+
+def decrypt_value(value: str, wrapped_key: str, user_id: int) -> str:
+    """Decrypt a stored secret value. Values written before encryption are returned unchanged."""
+    if not is_encrypted(value):
+        return value
+    if not wrapped_key:
+        raise DecryptionError("Encrypted value but the user has no data key")
+    try:
+        cipher = data_key_cache.get(wrapped_key)
+        return _open(cipher, value[len(ENCRYPTED_PREFIX):], f"user:{user_id}".encode()).decode()
+    except (InvalidTag, ValueError) as e:
+        raise DecryptionError(f"Value could not be decrypted ({type(e).__name__})") from e
+
+def encrypt_with_master_key(value: str) -> str:
+    """Encrypt data that has no owning user, such as the local secrets file"""
+    cipher = master_ciphers[CURRENT_MASTER_KEY_ID]
+    return f"{ENCRYPTED_PREFIX}{CURRENT_MASTER_KEY_ID}:{_seal(cipher, value.encode(), b'safevault-local')}"
+
+def decrypt_with_master_key(value: str) -> str:
+    if not is_encrypted(value):
+        return value
+    key_id, sealed = value[len(ENCRYPTED_PREFIX):].split(":", 1)
+    return _open(_master_cipher(key_id), sealed, b"safevault-local").decode()
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+# Change feed settings
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "100"))  # Events kept per user for resume
+EVENT_MAX_CHANNELS = int(os.getenv("EVENT_MAX_CHANNELS", "10000"))  # Users with a live or resumable feed
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "32"))  # Undelivered events per connection
+EVENT_OUTBOX_SIZE = int(os.getenv("EVENT_OUTBOX_SIZE", "10000"))  # Events waiting to be sent to Redis
+# Shared by all API replicas; without it events only reach clients of the same process
+REDIS_URL = os.getenv("REDIS_URL", "")
+REDIS_KEY_PREFIX = "safevault:events"
+
+# Versions are assigned and published in one step, so every replica sees them in order.
+# Events without create only count for users someone has subscribed to (see subscribe).
+PUBLISH_SCRIPT = """
+if ARGV[3] == '0' and redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local version = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', ARGV[1], version .. ' ' .. ARGV[2])
+return version
+"""
+CURRENT_VERSION_SCRIPT = """
+redis.call('SETNX', KEYS[1], 0)
+return redis.call('GET', KEYS[1])
+"""
+
+class Channel:
+    """One user's event log and the queues of their connected clients"""
+    __slots__ = ("version", "history", "subscribers")
+
+    def __init__(self, history_size: int):
+        self.version = 0
+        self.history = deque(maxlen=history_size)  # (version, payload) pairs
+        self.subscribers = set()
+
+class ChangeHub:
+    """Fan-out of per-user change events to server-sent event streams.
+
+    Events are serialized once when published and the same string is shared by every
+    subscriber, so an idle connection costs one small queue. Memory is bounded by the
+    per-user history, the per-connection queue and the number of channels kept.
+
+    Event ids are "<epoch>-<version>". Without Redis the epoch changes on every process
+    start, so a client resuming with an id from another process (or a trimmed history)
+    gets a reset event and refetches the full list. With REDIS_URL set, events go through
+    Redis pub/sub and every replica delivers them to its own clients; the epoch and the
+    per-user versions live in Redis, so a client can resume on any replica.
+    """
+
+    def __init__(self, history_size: int, max_channels: int, queue_size: int):
+        self.history_size = history_size
+        self.max_channels = max_channels
+        self.queue_size = queue_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self.channels = OrderedDict()
+        self.loop = None
+        self.redis = None
+        self.outbox = None
+
+    def _channel(self, username: str, create: bool) -> Optional[Channel]:
+        channel = self.channels.get(username)
+        if channel:
+            self.channels.move_to_end(username)
+        elif create:
+            channel = self.channels[username] = Channel(self.history_size)
+            self._evict()
+        return channel
+
+    def _evict(self):
+        if len(self.channels) <= self.max_channels:
+            return
+        # Drop the least recently used channels that nobody is listening to
+        for username in list(self.channels):
+            if len(self.channels) <= self.max_channels:
+                break
+            if not self.channels[username].subscribers:
+                del self.channels[username]
+
+    def _reset_payload(self, channel: Channel) -> str:
+        return f"id: {self.epoch}-{channel.version}\nevent: reset\ndata: {{}}\n\n"
+
+    def _push(self, channel: Channel, queue: asyncio.Queue, payload: str):
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Slow client: discard its backlog and ask it to resync instead
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(self._reset_payload(channel))
+
+    def _deliver(self, channel: Channel, version: int, event_type: str, data: str):
+        channel.version = version
+        payload = f"id: {self.epoch}-{version}\nevent: {event_type}\ndata: {data}\n\n"
+        channel.history.append((version, payload))
+        for queue in channel.subscribers:
+            self._push(channel, queue, payload)
+
+    def _reset(self, channel: Channel):
+        """Make the channel's clients refetch after events were lost"""
+        channel.history.clear()
+        for queue in channel.subscribers:
+            while not queue.empty():
+                queue.get_nowait()
+            self._push(channel, queue, self._reset_payload(channel))
+
+    def publish(self, username: str, event_type: str, data: dict, create: bool = True):
+        """Record an event for a user and push it to their connected clients.
+
+        With create=False the event is dropped unless the user already has a channel,
+        which keeps unauthenticated sources (such as failed logins) from allocating one.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a worker thread: hand over to the event loop that owns the queues
+            if self.loop:
+                self.loop.call_soon_threadsafe(self.publish, username, event_type, data, create)
+            return
+
+        data = json.dumps(data, default=str)
+        if self.redis:
+            try:
+                self.outbox.put_nowait((username, event_type, data, create))
+            except asyncio.QueueFull:
+                print(f"⚠️ Change feed outbox full - dropping {event_type} for {username}")
+                if username in self.channels:
+                    self._reset(self.channels[username])
+            return
+
+        channel = self._channel(username, create)
+        if channel is None:
+            return
+        self._deliver(channel, channel.version + 1, event_type, data)
+
+    async def start(self):
+        """Connect to Redis when REDIS_URL is set; otherwise events stay in this process"""
+        self.loop = asyncio.get_running_loop()
+        if not REDIS_URL:
+            print("📡 Change feed: in-process only (REDIS_URL not set)")
+            return
+        client = redis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            # One epoch for all replicas; it only changes if Redis loses its data
+            await client.set(f"{REDIS_KEY_PREFIX}:epoch", self.epoch, nx=True)
+            self.epoch = await client.get(f"{REDIS_KEY_PREFIX}:epoch")
+        except (RedisError, OSError) as e:
+            print(f"❌ Change feed Redis connection failed: {type(e).__name__} - {str(e)}")
+            print("📡 Change feed: in-process only")
+            await client.aclose()
+            return
+        self.redis = client
+        self.publish_script = client.register_script(PUBLISH_SCRIPT)
+        self.current_version_script = client.register_script(CURRENT_VERSION_SCRIPT)
+        self.outbox = asyncio.Queue(maxsize=EVENT_OUTBOX_SIZE)
+        asyncio.create_task(self._send())
+        asyncio.create_task(self._listen())
+        print(f"✅ Change feed: Redis pub/sub at {REDIS_URL}")
+
+    def _version_key(self, username: str) -> str:
+        return f"{REDIS_KEY_PREFIX}:version:{username}"
+
+    async def _send(self):
+        """Publish queued events to Redis in order, pipelining whatever has piled up"""
+        while True:
+            batch = [await self.outbox.get()]
+            while not self.outbox.empty():
+                batch.append(self.outbox.get_nowait())
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for username, event_type, data, create in batch:
+                    message = json.dumps({"username": username, "event_type": event_type, "data": data, "create": create})
+                    await self.publish_script(
+                        keys=[self._version_key(username)],
+                        args=[REDIS_KEY_PREFIX, message, int(create)],
+                        client=pipe
+                    )
+                await pipe.execute()
+            except (RedisError, OSError) as e:
+                # Other replicas miss these events; at least resync the clients here
+                print(f"❌ Change feed publish failed: {type(e).__name__} - {str(e)}")
+                for username in {event[0] for event in batch}:
+                    if username in self.channels:
+                        self._reset(self.channels[username])
+
+    async def _listen(self):
+        """Deliver events published by any replica to this process's clients"""
+        reconnecting = False
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(REDIS_KEY_PREFIX)
+                if reconnecting:
+                    # Anything published while disconnected is gone
+                    for channel in self.channels.values():
+                        self._reset(channel)
+                    print("✅ Change feed reconnected to Redis")
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._receive(message["data"])
+            except (RedisError, OSError) as e:
+                print(f"❌ Change feed lost Redis: {type(e).__name__} - {str(e)}")
+            finally:
+                await pubsub.aclose()
+            reconnecting = True
+            await asyncio.sleep(5)
+
+    def _receive(self, message: str):
+        version, _, body = message.partition(" ")
+        event = json.loads(body)
+        channel = self._channel(event["username"], event["create"])
+        if channel is None:
+            return
+        version = int(version)
+        if version <= channel.version:
+            return
+        if channel.version and version > channel.version + 1:
+            # Missed events in between (a dropped connection or an evicted channel)
+            channel.version = version - 1
+            self._reset(channel)
+        self._deliver(channel, version, event["event_type"], event["data"])
+
+    async def subscribe(self, username: str, last_event_id: Optional[str]):
+        """Register a client and return (queue, initial payloads to send)"""
+        self.loop = asyncio.get_running_loop()
+        channel = self._channel(username, True)
+        if self.redis and not channel.subscribers:
+            # Also marks the user as subscribed, so create=False events are counted from now on
+            try:
+                version = int(await self.current_version_script(keys=[self._version_key(username)]))
+                if version > channel.version:
+                    if channel.history:
+                        self._reset(channel)
+                    channel.version = version
+            except (RedisError, OSError) as e:
+                print(f"❌ Change feed version lookup failed: {type(e).__name__} - {str(e)}")
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        channel.subscribers.add(queue)
+
+        if not last_event_id:
+            return queue, [f"id: {self.epoch}-{channel.version}\nevent: ready\ndata: {{}}\n\n"]
+
+        epoch, _, version = last_event_id.partition("-")
+        since = int(version) if version.isdigit() else -1
+        if epoch != self.epoch or since > channel.version:
+            return queue, [self._reset_payload(channel)]
+        if since == channel.version:
+            return queue, []
+        oldest = channel.history[0][0] if channel.history else channel.version + 1
+        if oldest > since + 1:
+            return queue, [self._reset_payload(channel)]
+        return queue, [payload for version, payload in channel.history if version > since]
+
+    def unsubscribe(self, username: str, queue: asyncio.Queue):
+        channel = self.channels.get(username)
+        if channel:
+            channel.subscribers.discard(queue)
+
+    def connection_count(self) -> int:
+        return sum(len(channel.subscribers) for channel in self.channels.values())
+
+change_hub = ChangeHub(EVENT_HISTORY_SIZE, EVENT_MAX_CHANNELS, EVENT_QUEUE_SIZE)
@@ -16,8 +16,12 @@ SECURITY_EVENTS = Counter('safevault_security_events_total', 'Security events',
 # Business metrics
 ACTIVE_USERS = Gauge('safevault_active_users', 'Number of active users')
 SECRETS_COUNT = Gauge('safevault_secrets_total', 'Total number of secrets')
+EVENT_STREAMS = Gauge('safevault_event_streams', 'Open change feed connections')
 AWS_OPERATIONS = Counter('safevault_aws_operations_total', 'AWS operations', ['operation', 'status'])
 
+# Encryption metrics
+DATA_KEY_CACHE_LOOKUPS = Counter('safevault_data_key_cache_total', 'Data key cache lookups', ['result'])
+
 def get_metrics():
     """Return Prometheus metrics"""
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -49,4 +53,13 @@ def update_active_users(count: int):
 
 def update_secrets_count(count: int):
     """Update secrets count gauge"""
-    SECRETS_COUNT.set(count)
\ No newline at end of file
+    SECRETS_COUNT.set(count)
+
+def record_data_key_cache(hit: bool):
+    """Record data key cache lookups"""
+    result = 'hit' if hit else 'miss'
+    DATA_KEY_CACHE_LOOKUPS.labels(result=result).inc()
+
+def update_event_streams(count: int):
+    """Update open change feed connections gauge"""
+    EVENT_STREAMS.set(count)
\ No newline at end of file
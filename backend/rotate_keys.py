@@ -0,0 +1,115 @@
+"""Re-encryption job for key rotation.
+
+Usage:
+    python rotate_keys.py              # rewrap data keys under MASTER_KEY and encrypt any plaintext values
+    python rotate_keys.py --data-keys  # also issue new data keys and re-encrypt every value
+    python rotate_keys.py --offline    # required on SQLite, with the API stopped
+
+To rotate the master key, set MASTER_KEY to the new key and PREVIOUS_MASTER_KEYS to the
+old one, run this job, then drop the old key. Each user is committed separately, so the
+job can be stopped and re-run safely. A user with a value that cannot be decrypted is
+skipped and left on their old keys; the job reports them at the end and exits non-zero,
+so the old master key must stay until they are fixed.
+
+Each user's row is locked for update while their values are re-encrypted, and the API
+locks the same row before using the key, so the job can run against a live PostgreSQL
+database. SQLite ignores row locks, so there the API must be stopped first.
+"""
+import argparse
+import sys
+from typing import List, Tuple
+from cryptography.exceptions import InvalidTag
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import SessionLocal, User, Secret, create_tables, engine
+from encryption import (encrypt_value, decrypt_value, is_encrypted, generate_wrapped_data_key,
+                        wrap_data_key, unwrap_data_key, needs_rewrap, DecryptionError)
+
+def rotate_user(db, user: User, rotate_data_key: bool) -> Tuple[int, List[str]]:
+    """Rotate one user's keys.
+
+    Returns the number of values re-encrypted and the secrets that could not be decrypted.
+    If there are any, nothing is changed for this user and the row lock is released.
+    """
+    old_key = user.wrapped_data_key
+    secrets = db.query(Secret).filter(Secret.user_id == user.id, Secret.value != "[Stored in AWS]").all()
+    if not old_key and not secrets:
+        db.rollback()  # release the row lock
+        return 0, []
+
+    data_key_changed = rotate_data_key or not old_key
+    if data_key_changed:
+        new_key = generate_wrapped_data_key()
+    elif needs_rewrap(old_key):
+        try:
+            new_key = wrap_data_key(unwrap_data_key(old_key))
+        except (InvalidTag, ValueError) as e:
+            print(f"❌ {user.username}: data key could not be unwrapped ({type(e).__name__} {e})")
+            db.rollback()
+            return 0, ["<data key>"]
+    else:
+        new_key = old_key
+
+    reencrypted = 0
+    failures = []
+    for secret in secrets:
+        if data_key_changed or not is_encrypted(secret.value):
+            try:
+                plaintext = decrypt_value(secret.value, old_key, user.id)
+            except DecryptionError as e:
+                print(f"❌ {user.username}: secret {secret.name!r} (id {secret.id}) - {e}")
+                failures.append(secret.name)
+                continue
+            secret.value = encrypt_value(plaintext, new_key, user.id)
+            reencrypted += 1
+
+    if failures:
+        db.rollback()
+        return 0, failures
+
+    user.wrapped_data_key = new_key
+    db.commit()
+    return reencrypted, []
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotate SafeVault encryption keys")
+    parser.add_argument("--data-keys", action="store_true", help="issue new data keys and re-encrypt all values")
+    parser.add_argument("--offline", action="store_true", help="confirm the API is stopped (required on SQLite)")
+    args = parser.parse_args()
+    if engine.dialect.name == "sqlite" and not args.offline:
+        parser.error("SQLite has no row locks: stop the API, then re-run with --offline")
+
+    # Bring older databases up to the current schema first
+    create_tables()
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id)]
+        total = 0
+        skipped = {}
+        for user_id in user_ids:
+            # Locked until rotate_user commits or rolls back; API writers wait on the same row
+            user = db.query(User).filter(User.id == user_id).with_for_update().first()
+            username = user.username
+            count, failures = rotate_user(db, user, args.data_keys)
+            if failures:
+                skipped[username] = failures
+                print(f"⚠️ {username}: skipped, {len(failures)} values could not be decrypted")
+                continue
+            total += count
+            print(f"🔑 {username}: {count} values re-encrypted")
+    finally:
+        db.close()
+
+    if skipped:
+        print(f"⚠️ Key rotation incomplete: {len(user_ids) - len(skipped)} users rotated, "
+              f"{total} values re-encrypted, {len(skipped)} users skipped:")
+        for username, failures in skipped.items():
+            print(f"   {username}: {', '.join(failures)}")
+        print("   Keep the old master key until these values are fixed or deleted, then re-run.")
+        sys.exit(1)
+    print(f"✅ Key rotation complete: {len(user_ids)} users, {total} values re-encrypted")
+
+if __name__ == "__main__":
+    main()
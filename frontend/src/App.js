@@ -58,6 +58,74 @@ function App() {
     }
   }, [isLoggedIn]);
 
+  useEffect(() => {
+    if (!isLoggedIn || !token) return undefined;
+
+    // Live updates from the change feed. The session token stays out of the URL: each
+    // connection gets a short-lived stream token, so reconnects are handled here rather
+    // than by EventSource, resuming from the last event id seen.
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+    let lastEventId = '';
+
+    const handlers = {
+      ready: () => {},
+      secret_created: (data) => upsertSecret(data),
+      secret_updated: (data) => upsertSecret(data),
+      secret_deleted: ({ name }) => removeSecret(name),
+      // Sent when the missed events are no longer available
+      reset: () => fetchSecrets(),
+    };
+    const reconnect = () => {
+      if (!closed) retryTimer = setTimeout(connect, 5000);
+    };
+
+    const connect = async () => {
+      let streamToken;
+      try {
+        const response = await axios.post(`${API_BASE}/secrets/events/token`, {}, { headers });
+        streamToken = response.data.token;
+      } catch (error) {
+        reconnect();
+        return;
+      }
+      if (closed) return;
+
+      const params = new URLSearchParams({ token: streamToken });
+      if (lastEventId) params.set('last_event_id', lastEventId);
+      source = new EventSource(`${API_BASE}/secrets/events?${params}`);
+      Object.entries(handlers).forEach(([type, handler]) => {
+        source.addEventListener(type, (event) => {
+          if (event.lastEventId) lastEventId = event.lastEventId;
+          handler(JSON.parse(event.data));
+        });
+      });
+      source.onerror = () => {
+        source.close();
+        reconnect();
+      };
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, [isLoggedIn, token]);
+
+  // Applied both from mutation responses and from the change feed, so it must be idempotent
+  const upsertSecret = (secret) => {
+    setSecrets(prev => prev.some(s => s.name === secret.name)
+      ? prev.map(s => (s.name === secret.name ? secret : s))
+      : [...prev, secret]);
+  };
+
+  const removeSecret = (name) => {
+    setSecrets(prev => prev.filter(s => s.name !== name));
+  };
+
   const showNotification = (message) => {
     setNotification(message);
     setTimeout(() => setNotification(''), 3000);
@@ -81,12 +149,7 @@ function App() {
     }
     try {
       const response = await axios.post(`${API_BASE}/secrets`, newSecret, { headers });
-      
-      // Add small delay to ensure AWS sync completes
-      setTimeout(async () => {
-        await fetchSecrets();
-      }, 1000);
-      
+      upsertSecret(response.data.secret);
       setNewSecret({ name: '', value: '', description: '', category: 'general' });
       setShowForm(false);
       showNotification('✅ Secret created successfully');
@@ -109,12 +172,7 @@ function App() {
     if (!window.confirm(`Delete secret "${name}"? This cannot be undone.`)) return;
     try {
       await axios.delete(`${API_BASE}/secrets/${name}`, { headers });
-      
-      // Add small delay to ensure AWS sync completes
-      setTimeout(async () => {
-        await fetchSecrets();
-      }, 1000);
-      
+      removeSecret(name);
       setSelectedSecret(null);
       showNotification('🗑️ Secret deleted successfully');
     } catch (error) {